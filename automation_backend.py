@@ -1,7 +1,10 @@
+import os
+import sys
 import json
 import time
 import random
 import logging
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from selenium import webdriver
@@ -12,20 +15,56 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import threading
 import schedule
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
+LOG_FILE = 'classpoint_automation.log'
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('classpoint_automation.log'),
+        logging.FileHandler(LOG_FILE),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Settings the poll loop reads on every cycle; these can be changed while running
+DEFAULT_SETTINGS = {
+    'answerStrategy': 'random',
+    'scanInterval': 5,
+    'logLevel': 'INFO',
+    'webdriverLogLevel': 'WARNING',
+    'pollHeaderXpaths': [
+        # Most specific to least specific
+        "//div[contains(@class, 'active_title_head')]//h4[contains(text(), 'Multiple Choice')]",
+        "//h4[contains(text(), 'Multiple Choice')]",
+        "//div[contains(@class, 'active_title_head')]//h4",
+        "//h4",
+        "//*[contains(text(), 'Multiple Choice')]",
+        "//*[contains(text(), 'Poll')]",
+        "//*[contains(text(), 'Question')]",
+    ],
+    'answerAreaXpaths': [
+        "//div[contains(@class, 'custom_sheck')]",
+        "//div[contains(@class, 'MuiBox-root') and .//input]",
+        "//div[contains(@class, 'MuiFormGroup-root')]",
+        "//form//div[.//input]",
+        "//div[.//input]",
+    ],
+    'submitXpaths': [
+        ".//button[span[text()='Submit'] or text()='Submit']",
+        ".//div[contains(@class, 'sh_btn')]//button[contains(., 'Submit')]",
+        ".//button[contains(@class, 'MuiButton-containedPrimary') and (span[text()='Submit'] or text()='Submit')]",
+        ".//button[contains(text(), 'Submit')]",
+        ".//button",
+    ],
+}
+ANSWER_STRATEGIES = ['random', 'always_a', 'always_b', 'always_c', 'always_d']
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+
 class ClassPointAutomation:
     def __init__(self):
         self.driver = None
@@ -39,6 +78,11 @@ class ClassPointAutomation:
             'errors': []
         }
         self.polls_answered = 0
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.config_version = 0
+        self.config_lock = threading.Lock()
+        # Set to wake the poll loop early when settings change or automation stops
+        self.wake_event = threading.Event()
         
     def setup_driver(self):
         """Initialize Chrome WebDriver with appropriate options"""
@@ -78,6 +122,57 @@ class ClassPointAutomation:
         self.status['currentStep'] = step
         logger.info(f"Status update: {step}")
     
+    def validate_settings(self, changes: Dict) -> Dict:
+        """Validate a partial settings update and return the normalized values"""
+        if not isinstance(changes, dict) or not changes:
+            raise ValueError("Settings update must be a non-empty JSON object")
+        
+        validated = {}
+        for key, value in changes.items():
+            if key not in DEFAULT_SETTINGS:
+                raise ValueError(f"Unknown setting: {key}")
+            if key == 'answerStrategy':
+                if value not in ANSWER_STRATEGIES:
+                    raise ValueError(f"answerStrategy must be one of {ANSWER_STRATEGIES}")
+            elif key == 'scanInterval':
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0.1 <= value <= 300:
+                    raise ValueError("scanInterval must be a number of seconds between 0.1 and 300")
+            elif key in ('logLevel', 'webdriverLogLevel'):
+                if not isinstance(value, str) or value.upper() not in LOG_LEVELS:
+                    raise ValueError(f"{key} must be one of {LOG_LEVELS}")
+                value = value.upper()
+            else:
+                if not isinstance(value, list) or not value or not all(isinstance(x, str) and x.strip() for x in value):
+                    raise ValueError(f"{key} must be a non-empty list of XPath strings")
+                value = list(value)
+            validated[key] = value
+        return validated
+    
+    def update_settings(self, changes: Dict) -> Dict:
+        """Validate and atomically apply a settings update; takes effect on the next poll cycle"""
+        validated = self.validate_settings(changes)
+        with self.config_lock:
+            new_settings = dict(self.settings)
+            new_settings.update(validated)
+            # Single reference swap so the poll loop never sees a half-applied update
+            self.settings = new_settings
+            self.config_version += 1
+            version = self.config_version
+            
+            # Applied under the lock so the live levels always match the reported version
+            logger.setLevel(new_settings['logLevel'])
+            logging.getLogger('selenium').setLevel(new_settings['webdriverLogLevel'])
+            logging.getLogger('urllib3').setLevel(new_settings['webdriverLogLevel'])
+            logger.info(f"Applied settings version {version}: {validated}")
+        
+        self.wake_event.set()
+        return {'version': version, 'settings': new_settings}
+    
+    def get_settings(self) -> Dict:
+        """Return the current settings together with their version"""
+        with self.config_lock:
+            return {'version': self.config_version, 'settings': self.settings}
+    
     def join_classpoint(self, class_code: str, student_name: str) -> bool:
         """Join ClassPoint session with provided credentials"""
         try:
@@ -220,19 +315,11 @@ class ClassPointAutomation:
         import sys
         logger.info("Checking for active polls (multi-strategy)...")
         driver = self.driver
+        # Read settings once so a live update can't change them mid-cycle
+        settings = self.settings
         poll_found = False
         poll_header = None
-        poll_header_xpaths = [
-            # Most specific to least specific
-            "//div[contains(@class, 'active_title_head')]//h4[contains(text(), 'Multiple Choice')]",
-            "//h4[contains(text(), 'Multiple Choice')]",
-            "//div[contains(@class, 'active_title_head')]//h4",
-            "//h4",
-            "//*[contains(text(), 'Multiple Choice')]",
-            "//*[contains(text(), 'Poll')]",
-            "//*[contains(text(), 'Question')]",
-        ]
-        for xpath in poll_header_xpaths:
+        for xpath in settings['pollHeaderXpaths']:
             try:
                 elem = driver.find_element(By.XPATH, xpath)
                 if elem.is_displayed():
@@ -246,14 +333,7 @@ class ClassPointAutomation:
             logger.info("No poll header found (all strategies). Trying to find answer area anyway.")
         # Try to find the answer area (custom_sheck or similar)
         answer_area = None
-        answer_area_xpaths = [
-            "//div[contains(@class, 'custom_sheck')]",
-            "//div[contains(@class, 'MuiBox-root') and .//input]",
-            "//div[contains(@class, 'MuiFormGroup-root')]",
-            "//form//div[.//input]",
-            "//div[.//input]",
-        ]
-        for xpath in answer_area_xpaths:
+        for xpath in settings['answerAreaXpaths']:
             try:
                 elem = driver.find_element(By.XPATH, xpath)
                 if elem.is_displayed():
@@ -335,7 +415,7 @@ class ClassPointAutomation:
             logger.warning("Trying mouse automation as failsafe for answer selection.")
             return self._mouse_failsafe_answer()
         # Choose answer based on strategy
-        strategy = self.config.get('answerStrategy', 'random')
+        strategy = settings['answerStrategy']
         selected = None
         if strategy == 'random':
             selected = random.choice(answer_inputs)
@@ -371,15 +451,8 @@ class ClassPointAutomation:
             return self._mouse_failsafe_answer()
         # Find the submit button by multiple strategies
         submit_btn = None
-        submit_xpaths = [
-            ".//button[span[text()='Submit'] or text()='Submit']",
-            ".//div[contains(@class, 'sh_btn')]//button[contains(., 'Submit')]",
-            ".//button[contains(@class, 'MuiButton-containedPrimary') and (span[text()='Submit'] or text()='Submit')]",
-            ".//button[contains(text(), 'Submit')]",
-            ".//button",
-        ]
         for context in search_contexts:
-            for xpath in submit_xpaths:
+            for xpath in settings['submitXpaths']:
                 try:
                     btn = context.find_element(By.XPATH, xpath)
                     if btn.is_displayed() and btn.is_enabled():
@@ -448,8 +521,18 @@ class ClassPointAutomation:
         self.update_status(f"Poll #{self.polls_answered} answered (mouse failsafe)")
         return True
 
+    def wait_for_next_cycle(self):
+        """Sleep for scanInterval, re-reading it whenever the settings change"""
+        started = time.monotonic()
+        while self.is_running:
+            remaining = self.settings['scanInterval'] - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            if self.wake_event.wait(remaining):
+                self.wake_event.clear()
+    
     def run_continuous_polling(self):
-        """Continuously check for and answer polls every 5 seconds"""
+        """Continuously check for and answer polls every scanInterval seconds"""
         self.is_running = True
         self.status['isRunning'] = True
         
@@ -458,17 +541,14 @@ class ClassPointAutomation:
         
         while self.is_running:
             try:
-                if self.detect_and_answer_poll():
-                    # Successfully answered a poll, wait 5 seconds before checking again
-                    time.sleep(5)
-                else:
-                    # No poll found, wait 5 seconds before checking again
-                    time.sleep(5)
+                # Whether or not a poll was answered, wait before checking again
+                self.detect_and_answer_poll()
+                self.wait_for_next_cycle()
             except Exception as e:
                 error_msg = f"Error in poll monitoring loop: {str(e)}"
                 logger.error(error_msg)
                 self.add_error(error_msg)
-                time.sleep(5)  # Wait before retrying even if there's an error
+                self.wait_for_next_cycle()  # Wait before retrying even if there's an error
         
         logger.info("Stopped poll monitoring")
         self.status['isRunning'] = False
@@ -486,6 +566,18 @@ class ClassPointAutomation:
         self.status['errors'] = []
         
         try:
+            # Every session starts from the defaults, not from settings changed in an earlier one
+            live_settings = dict(DEFAULT_SETTINGS)
+            for key, value in config.items():
+                if key not in DEFAULT_SETTINGS:
+                    continue
+                try:
+                    live_settings.update(self.validate_settings({key: value}))
+                except ValueError as e:
+                    # Bad start values fall back to the default, e.g. an unknown strategy runs as random
+                    logger.warning(f"{str(e)}; using default {DEFAULT_SETTINGS[key]!r}")
+            self.update_settings(live_settings)
+            
             if not self.setup_driver():
                 self.stop_automation()
                 return False
@@ -495,7 +587,7 @@ class ClassPointAutomation:
                 return False
             
             # Start continuous polling in a separate thread
-            polling_thread = threading.Thread(target=self.run_continuous_polling)
+            polling_thread = threading.Thread(target=self.run_continuous_polling, name='poll-loop')
             polling_thread.daemon = True
             polling_thread.start()
             
@@ -513,6 +605,7 @@ class ClassPointAutomation:
         """Stop the automation process"""
         logger.info("Stopping automation...")
         self.is_running = False
+        self.wake_event.set()
         self.status['isRunning'] = False
         self.update_status("Stopping automation...")
         
@@ -527,6 +620,84 @@ class ClassPointAutomation:
         self.update_status("Automation stopped")
         logger.info("Automation stopped successfully")
 
+PROFILE_SAMPLE_INTERVAL = 0.01  # Target 100 samples per second
+PROFILE_MAX_SECONDS = 60
+PROFILE_KEEP_FILES = 20
+profile_lock = threading.Lock()
+
+def read_thread_cpu_ticks(native_id: int) -> Optional[int]:
+    """Return user+system CPU ticks of a thread from /proc, or None if unavailable"""
+    try:
+        with open(f'/proc/self/task/{native_id}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[11]) + int(fields[12])  # utime, stime
+    except (OSError, IndexError, ValueError):
+        return None
+
+def sample_thread_stacks(seconds: float, interval: float = PROFILE_SAMPLE_INTERVAL, include_idle: bool = False) -> Counter:
+    """Sample the stacks of all other threads and count them in collapsed-stack form.
+    
+    By default only samples where the thread used CPU since the previous tick are kept,
+    which needs per-thread CPU counters from /proc; include_idle keeps every sample
+    (wall-clock view).
+    """
+    own_ident = threading.get_ident()
+    threads = {t.ident: t for t in threading.enumerate()}
+    last_cpu = {}
+    samples = Counter()
+    next_sample = time.monotonic()
+    deadline = next_sample + seconds
+    while next_sample < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if ident not in threads:
+                threads = {t.ident: t for t in threading.enumerate()}
+            thread = threads.get(ident)
+            
+            if not include_idle:
+                native_id = getattr(thread, 'native_id', None)
+                cpu = read_thread_cpu_ticks(native_id) if native_id else None
+                previous = last_cpu.get(ident)
+                last_cpu[ident] = cpu
+                if cpu is None or previous is None or cpu == previous:
+                    continue
+            
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            thread_name = thread.name if thread else f"thread-{ident}"
+            samples[(thread_name, tuple(stack))] += 1
+        
+        # Schedule against the monotonic clock so time spent sampling doesn't lower the rate
+        next_sample += interval
+        now = time.monotonic()
+        if next_sample > now:
+            time.sleep(next_sample - now)
+        else:
+            next_sample = now
+    
+    # Format each frame once, after sampling, to keep the sampling loop cheap
+    labels = {}
+    stacks = Counter()
+    for (thread_name, stack), count in samples.items():
+        for key in stack:
+            if key not in labels:
+                code, lineno = key
+                labels[key] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{lineno})"
+        stacks[';'.join([thread_name] + [labels[key] for key in reversed(stack)])] += count
+    return stacks
+
+def prune_profiles(profile_dir: str, keep: int = PROFILE_KEEP_FILES):
+    """Delete all but the newest saved profiles"""
+    profiles = sorted(f for f in os.listdir(profile_dir) if f.startswith('profile_') and f.endswith('.collapsed'))
+    for name in profiles[:-keep]:
+        try:
+            os.remove(os.path.join(profile_dir, name))
+        except OSError as e:
+            logger.warning(f"Could not remove old profile {name}: {str(e)}")
+
 # Flask API
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:8080", "http://127.0.0.1:8080", "http://localhost:5173"])
@@ -567,10 +738,70 @@ def stop_automation():
         logger.error(f"Error stopping automation: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/automation/config', methods=['PATCH'])
+def update_config():
+    try:
+        changes = request.get_json(silent=True)
+        logger.info(f"Received config update: {changes}")
+        result = automation.update_settings(changes)
+        return jsonify({'message': 'Configuration updated', **result})
+    except ValueError as e:
+        logger.warning(f"Rejected config update: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating config: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/automation/config', methods=['GET'])
+def get_config():
+    return jsonify(automation.get_settings())
+
 @app.route('/api/automation/status', methods=['GET'])
 def get_status():
     return jsonify(automation.status)
 
+@app.route('/api/debug/profile', methods=['GET'])
+def profile_backend():
+    try:
+        seconds = float(request.args.get('seconds', '5'))
+    except ValueError:
+        return jsonify({'error': 'seconds must be a number'}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return jsonify({'error': f'seconds must be between 0 and {PROFILE_MAX_SECONDS}'}), 400
+    
+    # Only one profile at a time so a second request can't double the overhead
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({'error': 'A profile is already being captured'}), 409
+    
+    # Without per-thread CPU counters (e.g. Windows, macOS) idle samples can't be told apart
+    cpu_available = read_thread_cpu_ticks(threading.get_native_id()) is not None
+    include_idle = request.args.get('idle') == '1' or not cpu_available
+    try:
+        mode = 'wall-clock' if include_idle else 'cpu'
+        logger.info(f"Capturing {seconds}s {mode} sampling profile of all threads")
+        stacks = sample_thread_stacks(seconds, include_idle=include_idle)
+        collapsed = ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        
+        profile_dir = os.path.dirname(os.path.abspath(LOG_FILE))
+        profile_path = os.path.join(
+            profile_dir,
+            f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.collapsed"
+        )
+        with open(profile_path, 'w') as f:
+            f.write(collapsed)
+        prune_profiles(profile_dir)
+        logger.info(f"Saved profile with {sum(stacks.values())} samples to {profile_path}")
+        
+        headers = {'X-Profile-Path': profile_path, 'X-Profile-Mode': mode}
+        if not cpu_available:
+            headers['X-Profile-Warning'] = 'Per-thread CPU counters unavailable; profile includes idle samples'
+        return Response(collapsed, mimetype='text/plain', headers=headers)
+    except Exception as e:
+        logger.error(f"Error capturing profile: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        profile_lock.release()
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     logger.info("Health check requested")